@@ -1,14 +1,19 @@
 import logging
 
 import db_utils
-import pandas as pd
+import startup_profiler
 import streamlit as st
 
+run_start = startup_profiler.page_started()
+
 st.set_page_config(
     page_title="Home",
     page_icon="👋",
 )
 
+# load pandas, psycopg2 and the first DB connection while the static part of the page renders
+db_utils.warm_up()
+
 
 # Initialize session state if not set
 if "channel" not in st.session_state:
@@ -28,6 +33,8 @@ and you can also view the original text.
 
 
 st.write("# Telegram Data Clustering")
+startup_profiler.mark_first_paint("Home", run_start)
+startup_profiler.render_report()
 
 with st.spinner("loading channels..."):
     channels = db_utils.get_channel_names()
@@ -38,6 +45,8 @@ with st.form("channel_selector"):
 
 
 if selection_button:
+    pd = startup_profiler.lazy_import("pandas")
+
     # save the selected channel in the session state
     st.session_state["channel"] = channel
 
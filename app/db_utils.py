@@ -1,7 +1,74 @@
-import pandas as pd
-import psycopg2
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import startup_profiler
 import streamlit as st
 
+if TYPE_CHECKING:
+    import pandas as pd
+    import psycopg2
+
+# pandas and psycopg2 are imported lazily (see `startup_profiler.lazy_import`) so that pages can render
+# their static content before the heavy modules are loaded.
+
+# How long `get_connection` waits for the connection being opened by `warm_up`, and how old
+# the warm connection may be to be reused (the server may close idle connections).
+WARM_UP_TIMEOUT = 10
+WARM_CONNECTION_MAX_AGE = 30
+
+_warm_up_lock = threading.Lock()
+_warm_up_started = False
+_warm_up_done = threading.Event()
+# (credentials name, connection, time the connection was opened)
+_warm_connection = None
+
+
+def _connect(name: str) -> psycopg2.extensions.connection:
+    psycopg2 = startup_profiler.lazy_import("psycopg2")
+    db_credentials = st.secrets[name]
+    conn = psycopg2.connect(
+        dbname=db_credentials["dbname"],
+        user=db_credentials["user"],
+        password=db_credentials["password"],
+        host=db_credentials["host"],
+        port=db_credentials["port"],
+    )
+    return conn
+
+
+def _warm_up(name: str) -> None:
+    global _warm_connection
+
+    # connect first, the page waits for the connection, pandas is needed only after the first query
+    try:
+        conn = _connect(name)
+        with _warm_up_lock:
+            _warm_connection = (name, conn, time.monotonic())
+    except Exception as e:
+        logging.warning(f"Background database connection failed: {e}")
+    finally:
+        _warm_up_done.set()
+    startup_profiler.lazy_import("pandas")
+
+
+def warm_up(name="database") -> None:
+    """
+    Imports the heavy modules and opens the first database connection in a background thread,
+    so that the page can render its static content in the meantime. Only the first call has an effect.
+    :param name: The name of the database credentials in Streamlit secrets.
+    """
+    global _warm_up_started
+
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=_warm_up, args=(name,), name="db-warm-up", daemon=True).start()
+
 
 def get_connection(name="database") -> psycopg2.extensions.connection:
     """
@@ -14,18 +81,24 @@ def get_connection(name="database") -> psycopg2.extensions.connection:
     host = <host>
     port = <port>
 
+    The first call waits for the connection being opened in the background by `warm_up` and reuses it,
+    unless it is older than WARM_CONNECTION_MAX_AGE seconds.
+
     :param name: The name of the database credentials in Streamlit secrets.
     :return: A connection to the database.
     """
-    db_credentials = st.secrets[name]
-    conn = psycopg2.connect(
-        dbname=db_credentials["dbname"],
-        user=db_credentials["user"],
-        password=db_credentials["password"],
-        host=db_credentials["host"],
-        port=db_credentials["port"],
-    )
-    return conn
+    global _warm_connection
+
+    if _warm_up_started:
+        _warm_up_done.wait(WARM_UP_TIMEOUT)
+    with _warm_up_lock:
+        warm, _warm_connection = _warm_connection, None
+    if warm is not None:
+        warm_name, conn, opened_at = warm
+        if warm_name == name and not conn.closed and time.monotonic() - opened_at < WARM_CONNECTION_MAX_AGE:
+            return conn
+        conn.close()
+    return _connect(name)
 
 
 def get_clustering_info(channel: str) -> dict[str, list[int]]:
@@ -100,6 +173,7 @@ def get_llm_judge_text_data(channel: str) -> pd.DataFrame:
     :param channel: The name of the channel.
     :return: A DataFrame with the content of the llm_as_a_judge_texts table for a given channel.
     """
+    pd = startup_profiler.lazy_import("pandas")
 
     conn = get_connection()
     cur = conn.cursor()
@@ -140,6 +214,7 @@ def get_cluster_description(channel: str, cluster_id: int) -> pd.DataFrame:
     :param cluster_id: The ID of the cluster.
     :return: A DataFrame with the description of the cluster.
     """
+    pd = startup_profiler.lazy_import("pandas")
     conn = get_connection()
     cur = conn.cursor()
     cur.execute(
@@ -165,6 +240,7 @@ def get_llm_judge_decision_data(channel, llm_model) -> pd.DataFrame:
     :param llm_model: The name of the LLM model.
     :return: A DataFrame with the content of the llm_as_a_judge_decision table for a given channel.
     """
+    pd = startup_profiler.lazy_import("pandas")
 
     conn = get_connection()
     cur = conn.cursor()
@@ -225,43 +301,159 @@ def get_cluster_ids(channel: str) -> list[int]:
     return ret
 
 
-def get_messages_by_cluster(channel: str, cluster_id: id) -> pd.DataFrame:
+# Number of messages shown in the preview of a cluster and the seed used to select them.
+PREVIEW_SAMPLE_SIZE = 50
+PREVIEW_SEED = 0
+
+
+def _cluster_join(channel: str) -> str:
+    if "Benchmark" in channel:
+        return """
+            INNER JOIN benchmark_clustering c
+            ON (m.id = c.msg_id AND m.channel = c.channel_msg)"""
+    return """
+            INNER JOIN clustering c
+            ON (m.id = c.id AND m.channel = c.channel)"""
+
+
+def get_messages_by_cluster(
+    channel: str,
+    cluster_id: id,
+    sample_size: int | None = None,
+    seed: int = PREVIEW_SEED,
+    collapse_duplicates: bool | None = None,
+) -> pd.DataFrame:
     """
     Returns a DataFrame of messages for a given cluster ID from the messages table in the database.
+    If sample_size is given, only a reproducible sample of at most sample_size messages is returned.
+    The sample is selected in the database: the messages of the cluster are split by date into sample_size
+    buckets of equal size and from each bucket the message with the lowest hash of (seed, channel, id) is taken,
+    so the sample is spread across the time range of the cluster and does not change between runs.
+    Unless collapse_duplicates is False, only the earliest message of each near-duplicate group
+    (see near_duplicates.py) is returned, together with the number of messages of the group in the cluster,
+    as long as the groups were computed. Collapsing is done before sampling.
     :param channel: The name of the channel.
     :param cluster_id: The ID of the cluster.
+    :param sample_size: The maximum number of messages to return. If None, returns all messages of the cluster.
+    :param seed: The seed of the sample.
+    :param collapse_duplicates: Whether to return one representative message per near-duplicate group.
+        If None, the messages are collapsed if the near-duplicate groups exist.
 
     :return: A DataFrame of messages for the given cluster ID. Columns are: ["id", "date", "text_en", "text"]
+        and "duplicates" if the messages are collapsed.
+    """
+    pd = startup_profiler.lazy_import("pandas")
+
+    if collapse_duplicates is None:
+        collapse_duplicates = check_if_duplicate_groups_exist()
+
+    columns = ["id", "date", "text_en", "text"]
+    if collapse_duplicates:
+        columns.append("duplicates")
+        selected = """
+            SELECT * FROM (
+                SELECT *,
+                    COUNT(*) OVER (PARTITION BY channel, dup_group) AS duplicates,
+                    ROW_NUMBER() OVER (PARTITION BY channel, dup_group ORDER BY date, id) AS dup_rank
+                FROM cluster
+            ) AS grouped
+            WHERE dup_rank = 1"""
+        group_join = """
+            LEFT JOIN near_duplicate_groups g
+            ON (m.id = g.id AND m.channel = g.channel)"""
+        group_expr = "COALESCE(g.group_id, m.id)"
+    else:
+        selected = "SELECT * FROM cluster"
+        group_join = ""
+        group_expr = "m.id"
+
+    query = f"""
+        WITH cluster AS (
+            SELECT m.id as id, m.date as date, m.channel as channel,
+                m.text_en as text_en, m.text_original as text, {group_expr} as dup_group
+            FROM messages m{_cluster_join(channel)}{group_join}
+            WHERE c.cluster_id = %s
+                AND c.channel = %s
+        ), selected AS ({selected}
+        )"""
+    if sample_size is None:
+        query += f"""
+        SELECT {", ".join(columns)} FROM selected
+        """
+        params = (cluster_id, channel)
+    else:
+        query += f""", bucketed AS (
+            SELECT *, NTILE(%s) OVER (ORDER BY date, channel, id) AS time_bucket
+            FROM selected
+        ), ranked AS (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY time_bucket
+                ORDER BY MD5(%s || ':' || channel || ':' || id::text)
+            ) AS sample_rank
+            FROM bucketed
+        )
+        SELECT {", ".join(columns)}
+        FROM ranked
+        WHERE sample_rank = 1
+        ORDER BY date, channel, id
+        """
+        params = (cluster_id, channel, sample_size, str(seed))
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(query, params)
+    messages = cur.fetchall()
+    cur.close()
+    conn.close()
+    messages = pd.DataFrame(messages, columns=columns)
+    return messages
+
+
+@st.cache_data(ttl=600)
+def check_if_duplicate_groups_exist() -> bool:
+    """
+    Check if the near-duplicate groups were computed (see near_duplicates.py).
+    :return: True if the near_duplicate_groups table exists, False otherwise.
     """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('near_duplicate_groups') IS NOT NULL")
+    exists = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    return exists
 
+
+def get_cluster_size(channel: str, cluster_id: int, collapse_duplicates: bool = False) -> int:
+    """
+    Returns the number of messages in a given cluster.
+    :param channel: The name of the channel.
+    :param cluster_id: The ID of the cluster.
+    :param collapse_duplicates: If True, returns the number of distinct messages, i.e. near-duplicate groups
+        (see near_duplicates.py) are counted once.
+    :return: The number of messages in the cluster.
+    """
     conn = get_connection()
     cur = conn.cursor()
-    if "Benchmark" in channel:
-        query = """
-            SELECT m.id as id, m.date as date, 
-                m.text_en as text_en, m.text_original as text
-            FROM messages m
-            INNER JOIN benchmark_clustering c
-            ON (m.id = c.msg_id AND m.channel = c.channel_msg) 
-            WHERE c.cluster_id = %s
-                AND c.channel = %s"""
-        cur.execute(query, (cluster_id, channel))
-    else:
-        query = """
-            SELECT m.id as id, m.date as date, 
-                m.text_en as text_en, m.text_original as text
-            FROM messages m
-            INNER JOIN clustering c
-            ON (m.id = c.id AND m.channel = c.channel) 
+    if collapse_duplicates:
+        cur.execute(
+            f"""
+            SELECT COUNT(DISTINCT (m.channel, COALESCE(g.group_id, m.id)))
+            FROM messages m{_cluster_join(channel)}
+            LEFT JOIN near_duplicate_groups g
+            ON (m.id = g.id AND m.channel = g.channel)
             WHERE c.cluster_id = %s
                 AND c.channel = %s
-            """
-        cur.execute(query, (cluster_id, channel))
-    messages = cur.fetchall()
+            """,
+            (cluster_id, channel),
+        )
+    else:
+        table = "benchmark_clustering" if "Benchmark" in channel else "clustering"
+        cur.execute(f"SELECT COUNT(*) FROM {table} WHERE cluster_id = %s AND channel = %s", (cluster_id, channel))
+    count = cur.fetchone()[0]
     cur.close()
     conn.close()
-    messages = pd.DataFrame(messages, columns=["id", "date", "text_en", "text"])
-    return messages
+    return count
 
 
 def get_channel_messages(channel: str, columns: list[str] | None = None) -> pd.DataFrame:
@@ -270,6 +462,7 @@ def get_channel_messages(channel: str, columns: list[str] | None = None) -> pd.D
     :param channel: The name of the channel.
     :param columns: The columns to return. If None, returns ["id", "channel", "text"] columns.
     """
+    pd = startup_profiler.lazy_import("pandas")
     if columns is None:
         columns = ["id", "channel", "text"]
     conn = get_connection()
@@ -356,6 +549,7 @@ def get_channel_message_histogram(channel: str) -> pd.DataFrame:
     :param channel: The name of the channel.
     :return: A DataFrame with the month and the number of messages.
     """
+    pd = startup_profiler.lazy_import("pandas")
 
     def get_benchmark_data():
         import re
@@ -431,6 +625,7 @@ def get_clustering_keywords(channel: str) -> pd.DataFrame:
     :param channel: The name of the channel.
     :return: A DataFrame with the cluster ID and keywords.
     """
+    pd = startup_profiler.lazy_import("pandas")
     conn = get_connection()
     cur = conn.cursor()
     cur.execute(
@@ -447,3 +642,143 @@ def get_clustering_keywords(channel: str) -> pd.DataFrame:
     keywords = pd.DataFrame(keywords, columns=["cluster_id", "keywords"])
 
     return keywords
+
+
+# the fingerprint reads the whole table, cache it so that reruns of a page (widget changes) don't scan the table
+@st.cache_data(ttl=60)
+def get_table_version(table: str) -> str:
+    """
+    Returns a fingerprint of the content of a table: the number of rows and the sum of the hashes of all rows.
+    The sum does not depend on the order of the rows, so the fingerprint is computed in a single pass over the table
+    without sorting. Pass it to cached functions, so that their cache is invalidated when the data in the table change.
+    The fingerprint itself is cached for a minute, so changes are picked up with at most a minute delay.
+    :param table: The name of the table.
+    :return: The fingerprint of the table.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(('x' || LEFT(MD5(t::text), 16))::bit(64)::bigint::numeric), 0)
+        FROM {table} t
+        """
+    )
+    version = cur.fetchone()
+    cur.close()
+    conn.close()
+    return "-".join(map(str, version))
+
+
+# ttl is a fallback, the cache is invalidated by the version of the table
+@st.cache_data(ttl=3600)
+def get_llm_judge_analytics(version: str) -> dict[str, pd.DataFrame]:
+    """
+    Returns analytics of the llm_as_a_judge_decisions table for all channels and LLM models.
+    All the statistics are aggregated in the database, only the aggregates are transferred.
+
+    The returned dictionary contains the following DataFrames:
+    - "summary": number of decisions, accuracy (share of correct decisions) and reasoning length distribution
+      per channel and model. Rows with channel "All channels" aggregate over all channels.
+    - "confusion": number of decisions per channel, model, decision and whether the decision was correct
+      (is_correct, i.e. whether the LLM's answer corresponds with the clustering).
+    - "agreement": share of triplets on which two models made the same decision, per channel and pair of models.
+
+    :param version: The version of the llm_as_a_judge_decisions table (see get_table_version).
+        Only used to invalidate the cache.
+    :return: A dictionary with the DataFrames described above.
+    """
+    pd = startup_profiler.lazy_import("pandas")
+    conn = get_connection()
+    cur = conn.cursor()
+    # single pass over the table, the grouping sets produce the confusion matrix cells (0),
+    # the per channel summary (3) and the summary over all channels (7)
+    cur.execute(
+        """
+        WITH d AS (
+            SELECT
+                channel, llm_model, decision,
+                correct_decision::boolean AS is_correct,
+                LENGTH(reasoning) AS reasoning_length
+            FROM llm_as_a_judge_decisions
+        )
+        SELECT
+            GROUPING(channel, decision, is_correct) AS grouping_level,
+            channel, llm_model, decision, is_correct,
+            COUNT(*) AS decisions,
+            AVG(is_correct::int)::float AS accuracy,
+            MIN(reasoning_length) AS reasoning_min,
+            PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY reasoning_length) AS reasoning_p25,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY reasoning_length) AS reasoning_median,
+            PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY reasoning_length) AS reasoning_p75,
+            MAX(reasoning_length) AS reasoning_max,
+            AVG(reasoning_length)::float AS reasoning_mean
+        FROM d
+        GROUP BY GROUPING SETS (
+            (channel, llm_model, decision, is_correct),
+            (channel, llm_model),
+            (llm_model)
+        )
+        ORDER BY channel, llm_model, decision, is_correct
+        """
+    )
+    aggregates = cur.fetchall()
+    cur.execute(
+        """
+        SELECT
+            GROUPING(a.channel) AS grouping_level,
+            a.channel, a.llm_model AS model_a, b.llm_model AS model_b,
+            COUNT(*) AS triplets,
+            AVG((a.decision = b.decision)::int)::float AS agreement,
+            AVG((a.correct_decision::boolean AND b.correct_decision::boolean)::int)::float AS both_correct
+        FROM llm_as_a_judge_decisions a
+        INNER JOIN llm_as_a_judge_decisions b
+        ON (a.id = b.id AND a.channel = b.channel AND a.llm_model < b.llm_model)
+        GROUP BY GROUPING SETS (
+            (a.channel, a.llm_model, b.llm_model),
+            (a.llm_model, b.llm_model)
+        )
+        ORDER BY a.channel, model_a, model_b
+        """
+    )
+    agreement = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    aggregates = pd.DataFrame(
+        aggregates,
+        columns=[
+            "grouping_level",
+            "channel",
+            "llm_model",
+            "decision",
+            "is_correct",
+            "decisions",
+            "accuracy",
+            "reasoning_min",
+            "reasoning_p25",
+            "reasoning_median",
+            "reasoning_p75",
+            "reasoning_max",
+            "reasoning_mean",
+        ],
+    )
+    aggregates.loc[aggregates["grouping_level"] == 7, "channel"] = "All channels"
+    summary = aggregates[aggregates["grouping_level"] != 0].drop(columns=["grouping_level", "decision", "is_correct"])
+    confusion = aggregates[aggregates["grouping_level"] == 0][
+        ["channel", "llm_model", "decision", "is_correct", "decisions"]
+    ]
+
+    agreement = pd.DataFrame(
+        agreement,
+        columns=["grouping_level", "channel", "model_a", "model_b", "triplets", "agreement", "both_correct"],
+    )
+    agreement.loc[agreement["grouping_level"] == 1, "channel"] = "All channels"
+    agreement = agreement.drop(columns=["grouping_level"])
+
+    return {
+        "summary": summary.reset_index(drop=True),
+        "confusion": confusion.reset_index(drop=True),
+        "agreement": agreement.reset_index(drop=True),
+    }
@@ -0,0 +1,277 @@
+"""
+Near-duplicate grouping of messages (forwards and reposts) using MinHash and LSH.
+
+The groups are precomputed per channel and stored in the near_duplicate_groups table, one group ID per message.
+The LSH band keys are stored in the near_duplicate_bands table, so that new messages are compared only with
+the stored messages sharing a band key. Once the groups exist, db_utils.get_messages_by_cluster collapses
+near-duplicates by default. Run the script after new messages are loaded, only messages without a group are processed:
+
+    python app/near_duplicates.py --channel <channel>
+
+Use --full to recompute the groups of a channel from scratch (e.g. after changing --column).
+"""
+
+import argparse
+import hashlib
+import logging
+import re
+import zlib
+from collections import defaultdict
+
+import db_utils
+import numpy as np
+import psycopg2
+import psycopg2.extras
+
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# minimum estimated Jaccard similarity of two messages to be considered near-duplicates
+THRESHOLD = 0.8
+# the permutations must stay the same between runs, otherwise the stored signatures can't be compared
+SEED = 42
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(SEED)
+_PERM_A = _rng.randint(1, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_PERM_B = _rng.randint(0, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def _shingles(text: str) -> set[int]:
+    text = re.sub(r"https?://\S+", "", text.lower())
+    text = re.sub(r"\s+", " ", text).strip()
+    if not text:
+        return set()
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i : i + SHINGLE_SIZE].encode()) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str | None) -> np.ndarray | None:
+    """
+    Returns the MinHash signature of a text, computed over its character shingles.
+    :param text: The text of the message.
+    :return: An array of NUM_PERM hash values, or None if the text is empty.
+    """
+    shingles = _shingles(text or "")
+    if not shingles:
+        return None
+    hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Returns the LSH band keys of a MinHash signature. Two messages are candidates for near-duplicates
+    if they share at least one band key.
+    :param signature: The MinHash signature.
+    :return: A list of (band, band_hash) tuples, band_hash is a signed 64-bit hash of the band.
+    """
+    return [
+        (
+            band,
+            int.from_bytes(
+                hashlib.blake2b(
+                    signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND].tobytes(), digest_size=8
+                ).digest(),
+                "big",
+                signed=True,
+            ),
+        )
+        for band in range(BANDS)
+    ]
+
+
+def ensure_table(conn: psycopg2.extensions.connection) -> None:
+    """
+    Creates the near_duplicate_groups and near_duplicate_bands tables if they do not exist.
+    :param conn: A connection to the database.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS near_duplicate_groups (
+            channel TEXT NOT NULL,
+            id BIGINT NOT NULL,
+            group_id BIGINT NOT NULL,
+            signature BIGINT[],
+            PRIMARY KEY (channel, id)
+        );
+        CREATE INDEX IF NOT EXISTS near_duplicate_groups_group_idx ON near_duplicate_groups (channel, group_id);
+        CREATE TABLE IF NOT EXISTS near_duplicate_bands (
+            channel TEXT NOT NULL,
+            band SMALLINT NOT NULL,
+            band_hash BIGINT NOT NULL,
+            id BIGINT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS near_duplicate_bands_key_idx ON near_duplicate_bands (channel, band, band_hash);
+        """
+    )
+    conn.commit()
+    cur.close()
+
+
+def update_channel(conn: psycopg2.extensions.connection, channel: str, column="text_original", full=False) -> int:
+    """
+    Assigns a near-duplicate group ID to every message of a channel that does not have one yet.
+    Only the new messages are loaded. Their LSH band keys are looked up in the near_duplicate_bands table,
+    and only the signatures of the matching (candidate) messages are fetched and compared. Groups that become
+    connected through a new message are merged. The group ID is the smallest message ID in the group.
+    :param conn: A connection to the database.
+    :param channel: The name of the channel.
+    :param column: The column with the text of the messages, "text_original" or "text_en".
+    :param full: If True, the stored groups of the channel are dropped and recomputed.
+    :return: The number of newly grouped messages.
+    """
+    if column not in ("text_original", "text_en"):
+        raise ValueError(f"Unsupported column: {column}")
+
+    cur = conn.cursor()
+    if full:
+        cur.execute("DELETE FROM near_duplicate_groups WHERE channel = %s", (channel,))
+        cur.execute("DELETE FROM near_duplicate_bands WHERE channel = %s", (channel,))
+
+    cur.execute(
+        f"""
+        SELECT m.id, m.{column}
+        FROM messages m
+        WHERE m.channel = %s
+            AND NOT EXISTS (SELECT 1 FROM near_duplicate_groups g WHERE g.channel = m.channel AND g.id = m.id)
+        """,
+        (channel,),
+    )
+    new_messages = cur.fetchall()
+    if not new_messages:
+        conn.commit()
+        cur.close()
+        return 0
+
+    new_signatures = {msg_id: minhash_signature(text) for msg_id, text in new_messages}
+    new_keys = {msg_id: band_keys(signature) for msg_id, signature in new_signatures.items() if signature is not None}
+
+    # stored messages sharing a band key with any of the new messages, there are none on the first (or --full) run
+    has_bands = False
+    if not full:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM near_duplicate_bands WHERE channel = %s)", (channel,))
+        has_bands = cur.fetchone()[0]
+    candidate_ids = set()
+    if has_bands and new_keys:
+        # load the keys in a temporary table, so that the lookup is a single indexed join
+        cur.execute("CREATE TEMPORARY TABLE new_band_keys (band SMALLINT, band_hash BIGINT) ON COMMIT DROP")
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO new_band_keys (band, band_hash) VALUES %s",
+            list({key for keys in new_keys.values() for key in keys}),
+            page_size=10000,
+        )
+        cur.execute(
+            """
+            SELECT DISTINCT b.id
+            FROM near_duplicate_bands b
+            INNER JOIN new_band_keys k
+            ON (b.band = k.band AND b.band_hash = k.band_hash)
+            WHERE b.channel = %s
+            """,
+            (channel,),
+        )
+        candidate_ids = {row[0] for row in cur.fetchall()}
+    candidates = []
+    if candidate_ids:
+        cur.execute(
+            "SELECT id, group_id, signature FROM near_duplicate_groups WHERE channel = %s AND id = ANY(%s)",
+            (channel, list(candidate_ids)),
+        )
+        candidates = cur.fetchall()
+
+    # union-find over group IDs of the stored candidates and IDs of the new messages
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(x, y):
+        x, y = find(x), find(y)
+        if x != y:
+            parent[max(x, y)] = min(x, y)
+
+    node = {}
+    signatures = {}
+    buckets = defaultdict(list)
+    for msg_id, group_id, signature in candidates:
+        parent.setdefault(group_id, group_id)
+        node[msg_id] = group_id
+        signatures[msg_id] = np.array(signature, dtype=np.uint64)
+        for key in band_keys(signatures[msg_id]):
+            buckets[key].append(msg_id)
+
+    for msg_id, signature in new_signatures.items():
+        parent.setdefault(msg_id, msg_id)
+        node[msg_id] = msg_id
+        if signature is None:
+            continue
+        keys = new_keys[msg_id]
+        for candidate in {candidate for key in keys for candidate in buckets.get(key, ())}:
+            if find(node[candidate]) != find(msg_id) and np.mean(signatures[candidate] == signature) >= THRESHOLD:
+                union(node[candidate], msg_id)
+        signatures[msg_id] = signature
+        for key in keys:
+            buckets[key].append(msg_id)
+
+    psycopg2.extras.execute_values(
+        cur,
+        "INSERT INTO near_duplicate_groups (channel, id, group_id, signature) VALUES %s",
+        [
+            (channel, msg_id, find(msg_id), None if signature is None else signature.astype(np.int64).tolist())
+            for msg_id, signature in new_signatures.items()
+        ],
+        page_size=1000,
+    )
+    psycopg2.extras.execute_values(
+        cur,
+        "INSERT INTO near_duplicate_bands (channel, band, band_hash, id) VALUES %s",
+        [(channel, band, band_hash, msg_id) for msg_id, keys in new_keys.items() for band, band_hash in keys],
+        page_size=1000,
+    )
+    # stored groups merged with another group through a new message
+    merged = [(channel, find(group_id), group_id) for group_id in {group_id for _, group_id, _ in candidates}]
+    merged = [row for row in merged if row[1] != row[2]]
+    if merged:
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            UPDATE near_duplicate_groups AS g SET group_id = v.new_group_id
+            FROM (VALUES %s) AS v (channel, new_group_id, group_id)
+            WHERE g.channel = v.channel AND g.group_id = v.group_id
+            """,
+            merged,
+        )
+    conn.commit()
+    cur.close()
+    return len(new_signatures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group near-duplicate messages of Telegram channels.")
+    parser.add_argument("--channel", help="The name of the channel. If not given, all channels are processed.")
+    parser.add_argument("--column", default="text_original", choices=["text_original", "text_en"])
+    parser.add_argument("--full", action="store_true", help="Recompute the groups from scratch.")
+    args = parser.parse_args()
+
+    channels = [args.channel] if args.channel else db_utils.get_channel_names()
+    conn = db_utils.get_connection()
+    ensure_table(conn)
+    for channel in channels:
+        count = update_channel(conn, channel, column=args.column, full=args.full)
+        logging.info(f"{channel}: grouped {count} new messages")
+    conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
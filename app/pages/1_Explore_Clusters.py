@@ -1,6 +1,9 @@
 import db_utils
+import startup_profiler
 import streamlit as st
 
+run_start = startup_profiler.page_started()
+
 
 def cluster_selection_logic():
     # check if channel has keywords
@@ -19,6 +22,8 @@ def load_app():
     # Streamlit app
     st.title("Cluster Data Viewer")
     st.write(f"**Selected channel**: {st.session_state.channel}")
+    startup_profiler.mark_first_paint("Explore Clusters", run_start)
+    startup_profiler.render_report()
 
     # Dropdown menu for selecting cluster ID
     st.sidebar.header("Select Cluster")
@@ -33,9 +38,28 @@ def load_app():
     # summary_checkbox = st.sidebar.checkbox("Generate cluster description (Using LLM)", value=True)
     summary_checkbox = False
 
+    # preview shows only a bounded sample of messages, so large clusters load as fast as small ones
+    preview_checkbox = st.sidebar.checkbox(
+        "Preview mode",
+        value=True,
+        help=f"Show a sample of {db_utils.PREVIEW_SAMPLE_SIZE} messages spread across the time range of the cluster",
+    )
+    # near-duplicate groups are available only after running near_duplicates.py
+    collapse_checkbox = db_utils.check_if_duplicate_groups_exist() and st.sidebar.checkbox(
+        "Collapse near-duplicates",
+        value=True,
+        help="Show one message per group of near-identical messages (forwards, reposts) with the size of the group",
+    )
+
     # Display data corresponding to the selected cluster ID
     if st.sidebar.button("Show Data"):
-        cluster_data = db_utils.get_messages_by_cluster(st.session_state.channel, selected_cluster_id)
+        sample_size = db_utils.PREVIEW_SAMPLE_SIZE if preview_checkbox else None
+        cluster_data = db_utils.get_messages_by_cluster(
+            st.session_state.channel,
+            selected_cluster_id,
+            sample_size=sample_size,
+            collapse_duplicates=collapse_checkbox,
+        )
         if not cluster_data.empty:
             st.write(f"Displaying data for Cluster ID: {selected_cluster_id}")
             if summary_checkbox:
@@ -52,7 +76,26 @@ def load_app():
                     st.write(f"**Keywords**: {df_description['keywords'].iloc[0]}")
                 else:
                     st.write("No description available for this cluster.")
-            st.write(f"**Number of messages in cluster:** {cluster_data.shape[0]}")
+            if preview_checkbox:
+                cluster_size = db_utils.get_cluster_size(st.session_state.channel, selected_cluster_id)
+                distinct_size = (
+                    db_utils.get_cluster_size(st.session_state.channel, selected_cluster_id, collapse_duplicates=True)
+                    if collapse_checkbox
+                    else cluster_size
+                )
+            elif collapse_checkbox:
+                cluster_size = int(cluster_data["duplicates"].sum())
+                distinct_size = cluster_data.shape[0]
+            else:
+                cluster_size = distinct_size = cluster_data.shape[0]
+            st.write(f"**Number of messages in cluster:** {cluster_size}")
+            if collapse_checkbox:
+                st.write(f"**Distinct messages (near-duplicates collapsed):** {distinct_size}")
+            if preview_checkbox and distinct_size > cluster_data.shape[0]:
+                st.write(
+                    f"Showing a preview of {cluster_data.shape[0]} messages. "
+                    "Uncheck *Preview mode* to show all messages."
+                )
 
             st.header("Messages:")
             for _, row in cluster_data.iterrows():
@@ -65,6 +108,8 @@ def load_app():
                     st.write(f"Message ID: {row['id']}")
                     st.write(f"Date: {row['date']}")
                     st.write(f"Text: {row['text']}")
+                if collapse_checkbox and row["duplicates"] > 1:
+                    st.write(f"*Near-duplicates in cluster: {row['duplicates']}*")
                 st.write("---")
         else:
             st.write(f"No data available for Cluster ID: {selected_cluster_id}")
@@ -75,9 +120,13 @@ st.set_page_config(
     page_icon="🔍",
 )
 
+db_utils.warm_up()
+
 
 if "channel" not in st.session_state or st.session_state.channel is None:
     st.warning("**Please select a channel in the Home page.**", icon="⚠️")
+    startup_profiler.mark_first_paint("Explore Clusters", run_start)
+    startup_profiler.render_report()
 else:
     # Load the app
     with st.spinner("Loading data from DB..."):
@@ -1,11 +1,16 @@
 import db_utils
+import startup_profiler
 import streamlit as st
 
+run_start = startup_profiler.page_started()
+
 st.set_page_config(
     page_title="LLM-as-a-Judge",
     page_icon="⚖️",
 )
 
+db_utils.warm_up()
+
 
 st.title("LLM-as-a-Judge")
 st.write(
@@ -49,6 +54,9 @@ with st.expander("System prompt for LLMs:"):
     - **Text 2:** `[Insert text here]`
     """)
 
+startup_profiler.mark_first_paint("LLM-as-a-Judge", run_start)
+startup_profiler.render_report()
+
 with st.form("channel_selector"):
     channel = st.selectbox("Channel:", db_utils.llm_judge_channels(), help="Select a channel to view the data")
     selection_button = st.form_submit_button("Select")
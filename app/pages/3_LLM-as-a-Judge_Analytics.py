@@ -0,0 +1,97 @@
+import db_utils
+import startup_profiler
+import streamlit as st
+
+run_start = startup_profiler.page_started()
+
+st.set_page_config(
+    page_title="LLM-as-a-Judge Analytics",
+    page_icon="📊",
+)
+
+db_utils.warm_up()
+
+
+st.title("LLM-as-a-Judge Analytics")
+st.write(
+    """
+    This page summarizes the decisions of the LLM-as-a-Judge experiment across all channels and LLM models.
+    The statistics are computed in the database and refreshed within a minute after the decisions change.
+    A decision is counted as correct when the LLM's answer corresponds with the clustering.
+    """
+)
+startup_profiler.mark_first_paint("LLM-as-a-Judge Analytics", run_start)
+startup_profiler.render_report()
+
+with st.spinner("Loading analytics from DB..."):
+    version = db_utils.get_table_version("llm_as_a_judge_decisions")
+    analytics = db_utils.get_llm_judge_analytics(version)
+
+summary = analytics["summary"]
+confusion = analytics["confusion"]
+agreement = analytics["agreement"]
+
+if summary.empty:
+    st.write("No LLM-as-a-Judge decisions in DB.")
+    st.stop()
+
+st.write("## Accuracy")
+st.dataframe(
+    summary.pivot(index="channel", columns="llm_model", values="accuracy"),
+    use_container_width=True,
+)
+st.dataframe(
+    summary[["channel", "llm_model", "decisions", "accuracy"]],
+    hide_index=True,
+    use_container_width=True,
+)
+
+st.write("## Inter-model agreement")
+st.write("Share of triplets on which both models made the same decision and on which both were correct.")
+if agreement.empty:
+    st.write("Decisions of at least two models are needed to compute the agreement.")
+else:
+    st.dataframe(agreement, hide_index=True, use_container_width=True)
+
+st.write("## Confusion matrix")
+st.write("Number of LLM decisions (rows) that do or do not correspond with the clustering (columns).")
+channel = st.selectbox("Channel:", summary["channel"].unique(), help="Select a channel (or all channels)")
+llm_model = st.selectbox("LLM model:", summary["llm_model"].unique())
+if channel == "All channels":
+    cells = confusion[confusion["llm_model"] == llm_model]
+else:
+    cells = confusion[(confusion["channel"] == channel) & (confusion["llm_model"] == llm_model)]
+if cells.empty:
+    st.write("No decisions for this channel and model.")
+else:
+    st.dataframe(
+        cells.assign(
+            correspondence=cells["is_correct"].map({True: "Corresponds with clustering", False: "Does not correspond"})
+        ).pivot_table(
+            index="decision",
+            columns="correspondence",
+            values="decisions",
+            aggfunc="sum",
+            fill_value=0,
+        ),
+        use_container_width=True,
+    )
+
+st.write("## Reasoning length")
+st.write("Distribution of the length of the LLM's reasoning (in characters).")
+st.dataframe(
+    summary[
+        [
+            "channel",
+            "llm_model",
+            "reasoning_min",
+            "reasoning_p25",
+            "reasoning_median",
+            "reasoning_p75",
+            "reasoning_max",
+            "reasoning_mean",
+        ]
+    ],
+    hide_index=True,
+    use_container_width=True,
+)
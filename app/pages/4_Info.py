@@ -1,5 +1,7 @@
+import startup_profiler
 import streamlit as st
 
+run_start = startup_profiler.page_started()
 
 st.set_page_config(
     page_title="App Information",
@@ -15,3 +17,5 @@ st.write(
     The application was developed as part of a master thesis called Telegram data clustering. The author is Ivan Žižka.
     """
 )
+startup_profiler.mark_first_paint("Info", run_start)
+startup_profiler.render_report()
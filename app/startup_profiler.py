@@ -0,0 +1,88 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from types import ModuleType
+
+import streamlit as st
+
+# Taken when the first page of the process imports this module, i.e. as close to the cold start as we can get.
+PROCESS_START = time.perf_counter()
+
+# Set CLUSTER_VIEWER_PROFILE_STARTUP=1 to show the startup report in the sidebar of every page.
+ENABLED = os.environ.get("CLUSTER_VIEWER_PROFILE_STARTUP", "0").lower() not in ("", "0", "false", "no")
+
+_lock = threading.Lock()
+_import_times: dict[str, float] = {}
+_first_paint_times: dict[str, dict[str, float]] = {}
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Imports a module on first use and records how long the import took.
+    Heavy modules (pandas, psycopg2) are imported through this function so that pages
+    can render their static content before paying the import cost.
+    :param name: The name of the module.
+    :return: The imported module.
+    """
+    # always go through importlib, a module in sys.modules may still be importing in another thread
+    # (see db_utils.warm_up) and import_module waits for it to finish
+    first_import = name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    if first_import:
+        with _lock:
+            _import_times.setdefault(name, elapsed)
+    return module
+
+
+def page_started() -> float:
+    """
+    Returns the timestamp of the start of the current page run. Pass it to `mark_first_paint`.
+    :return: The current value of the performance counter.
+    """
+    return time.perf_counter()
+
+
+def mark_first_paint(page: str, run_start: float) -> None:
+    """
+    Records the time-to-first-paint of a page, i.e. the time until its static content was sent to the browser.
+    Both the time since the start of the page run and the time since the process start are recorded.
+    :param page: The name of the page.
+    :param run_start: The timestamp returned by `page_started` at the top of the page.
+    """
+    now = time.perf_counter()
+    timing = {"run": now - run_start, "process": now - PROCESS_START}
+    with _lock:
+        first_run = page not in _first_paint_times
+        _first_paint_times.setdefault(page, timing)
+    if ENABLED and first_run:
+        logging.info(f"First paint of {page}: {timing['run'] * 1000:.1f} ms (process: {timing['process']:.2f} s)")
+
+
+def render_report() -> None:
+    """
+    Renders the startup report (import time per module and time-to-first-paint per page) in the sidebar.
+    Does nothing unless the profiler is enabled.
+    """
+    if not ENABLED:
+        return
+
+    with _lock:
+        import_times = dict(_import_times)
+        first_paint_times = dict(_first_paint_times)
+
+    with st.sidebar.expander("Startup profile"):
+        st.write("**Import time per module**")
+        if import_times:
+            for name, elapsed in sorted(import_times.items(), key=lambda item: item[1], reverse=True):
+                st.write(f"- `{name}`: {elapsed * 1000:.1f} ms")
+        else:
+            st.write("No deferred imports yet.")
+
+        st.write("**Time to first paint per page** (first run)")
+        for page, timing in first_paint_times.items():
+            st.write(f"- {page}: {timing['run'] * 1000:.1f} ms (since process start: {timing['process']:.2f} s)")